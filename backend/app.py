@@ -1,30 +1,97 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask.json.provider import JSONProvider
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import (
+    Integer, String, and_, case, cast, delete, event, func, insert, inspect, literal, or_, select, text,
+    type_coerce
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateIndex
+from werkzeug.security import check_password_hash, generate_password_hash
 from flask_cors import CORS
 from dateutil import parser
 import uuid
 import datetime
+import hashlib
+import threading
+import time
 import jwt
+import msgspec
+import orjson
 import os
+from cachetools import TTLCache
+from functools import lru_cache
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
+from typing import List, Optional
 
 # Load environment variables from .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+class OrjsonProvider(JSONProvider):
+    """Backs jsonify and request.get_json with orjson instead of the stdlib json module."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_secret_key_here')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('SQLALCHEMY_DATABASE_URI', 'sqlite:///ailearn.db')
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Keep connections pooled across requests; pre-ping replaces connections dropped by the server
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_recycle': 1800,
+    'pool_pre_ping': True
+}
+db_url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+# In-memory SQLite runs on a single shared connection (StaticPool), which takes no sizing options
+if not (db_url.get_backend_name() == 'sqlite' and db_url.database in (None, '', ':memory:')):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update(
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    )
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Pooled SQLite connections are handed between worker threads
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {'check_same_thread': False}
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 ALLOWED_EXTENSIONS = {'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Argon2id cost parameters; defaults target roughly 100 ms per hash
+app.config['ARGON2_TIME_COST'] = int(os.environ.get('ARGON2_TIME_COST', 2))
+app.config['ARGON2_MEMORY_COST'] = int(os.environ.get('ARGON2_MEMORY_COST', 64 * 1024))
+app.config['ARGON2_PARALLELISM'] = int(os.environ.get('ARGON2_PARALLELISM', 1))
 db = SQLAlchemy(app)
 
+# SQLite tuning: WAL lets readers proceed during writes and, with synchronous=NORMAL,
+# avoids an fsync per commit; mmap serves reads straight from the page cache
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_sqlite_pragmas)
+
 # Remove RotatingFileHandler setup for file logging
 # Logging will use default Flask console output
 
+def uuid7():
+    """Time-ordered UUID (RFC 9562 version 7), so new room ids land at the end of indexes."""
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | (0x7 << 76)  # version 7
+    value = value & ~(0x3 << 62) | (0x2 << 62)  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
 # Models
 class Student(db.Model):
     student_id = db.Column(db.Integer, primary_key=True)
@@ -44,6 +111,7 @@ class Teacher(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
 class Class(db.Model):
+    __table_args__ = (db.Index('ix_class_target_institution', 'target_class', 'institution_name'),)
     class_id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.Text)
     teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.teacher_id'))
@@ -51,17 +119,18 @@ class Class(db.Model):
     institution_name = db.Column(db.Text)
     start_time = db.Column(db.DateTime)
     end_time = db.Column(db.DateTime)
-    room_id = db.Column(db.String(36), default=lambda: str(uuid.uuid4()))
+    room_id = db.Column(db.String(36), default=lambda: str(uuid7()))
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
 class ChatMessage(db.Model):
     message_id = db.Column(db.Integer, primary_key=True)
-    room_id = db.Column(db.String(36), nullable=False, index=True)
+    room_id = db.Column(db.String(36), nullable=False)
     sender_name = db.Column(db.String(255), nullable=False)
     sender_role = db.Column(db.String(20), nullable=False)  # 'teacher' or 'student'
     message_content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     is_system_message = db.Column(db.Boolean, default=False)  # For system notifications
+    __table_args__ = (db.Index('ix_chat_room_ts', 'room_id', 'timestamp', 'message_id'),)
     
     def to_dict(self):
         return {
@@ -74,119 +143,289 @@ class ChatMessage(db.Model):
             'isSystemMessage': self.is_system_message
         }
 
+# Indexes dropped from the models because a composite index's leading column covers them
+SUPERSEDED_INDEXES = ['ix_chat_message_room_id']
+
+# db.create_all() skips tables that already exist, so indexes added to a model
+# later are never built on existing databases; create any that are missing and
+# drop superseded ones. IF [NOT] EXISTS keeps this safe when several workers start at once.
+def migrate_indexes():
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+        for name in SUPERSEDED_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+with app.app_context():
+    migrate_indexes()
+
+# Password helpers
+password_hasher = PasswordHasher(
+    time_cost=app.config['ARGON2_TIME_COST'],
+    memory_cost=app.config['ARGON2_MEMORY_COST'],
+    parallelism=app.config['ARGON2_PARALLELISM']
+)
+
+def _make_hash_pool():
+    # Argon2 is CPU-bound native code that releases the GIL. Under gevent the stdlib
+    # thread pool is monkey-patched into greenlets, so use gevent's pool of real OS
+    # threads to keep other greenlets serving while a hash runs.
+    try:
+        from gevent import monkey
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+    except ImportError:
+        return None
+    if not monkey.is_module_patched('threading'):
+        return None
+    return NativeThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+HASH_POOL = _make_hash_pool()
+
+def run_in_hash_pool(fn, *args):
+    if HASH_POOL is None:
+        return fn(*args)
+    return HASH_POOL.submit(fn, *args).result()
+
+def hash_password(password):
+    return password_hasher.hash(password)
+
+def verify_password(stored_hash, password):
+    """Returns (valid, new_hash); new_hash is set when the stored hash should be upgraded."""
+    if stored_hash.startswith('$argon2'):
+        try:
+            password_hasher.verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False, None
+        return True, hash_password(password) if password_hasher.check_needs_rehash(stored_hash) else None
+    # Legacy werkzeug (pbkdf2/scrypt) hashes are re-hashed with argon2 on successful login
+    if check_password_hash(stored_hash, password):
+        return True, hash_password(password)
+    return False, None
+
 # JWT helper
+# Verified token payloads keyed by a digest of the token, so repeated requests
+# from the same client skip HMAC verification. Failed verifications are never cached.
+_token_cache = TTLCache(maxsize=10000, ttl=30)
+_token_cache_lock = threading.Lock()
+
+TOKEN_TTL_SECONDS = 24 * 60 * 60
+_jws = jwt.PyJWS(algorithms=['HS256'])
+
 def encode_auth_token(user_id, user_type, email):
-    print('DEBUG SECRET_KEY (encode):', app.config['SECRET_KEY'])
+    now = int(time.time())
     payload = {
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(days=1),
-        'iat': datetime.datetime.utcnow(),
+        'exp': now + TOKEN_TTL_SECONDS,
+        'iat': now,
         'sub': str(user_id),  # Ensure subject is a string
         'type': user_type,
         'email': email
     }
-    token = jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
-    if isinstance(token, bytes):
-        token = token.decode('utf-8')
-    return token
+    # Claims are already plain JSON types, so sign the serialized payload directly
+    return _jws.encode(orjson.dumps(payload), app.config['SECRET_KEY'], algorithm='HS256')
 
 def decode_auth_token(token):
-    print('DEBUG SECRET_KEY (decode):', app.config['SECRET_KEY'])
-    print('DEBUG token type:', type(token))
-    print('DEBUG token repr:', repr(token))
+    # A compact JWS always has three dot-separated segments; reject anything else
+    # before spending any HMAC or base64 work on it
+    if not token or token.count('.') != 2:
+        return None
+    key = hashlib.sha256(token.encode('utf-8')).digest()[:16]
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached and cached[1] > time.time():
+        return cached[0]
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'],
+                             options={'require': ['exp', 'sub', 'type', 'email']})
+        with _token_cache_lock:
+            _token_cache[key] = (payload, payload['exp'])
         return payload
     except jwt.ExpiredSignatureError:
-        print('DEBUG: Token expired')
+        app.logger.debug('Token expired')
         return None
     except jwt.InvalidTokenError as e:
-        print('DEBUG: Invalid token:', str(e))
+        app.logger.debug('Invalid token: %s', e)
+        return None
+
+# JSON response for high-volume endpoints; skips jsonify's bytes -> str -> bytes round trip
+def orjson_response(obj, status=200):
+    return Response(orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC), status=status, mimetype='application/json')
+
+# Request schemas: bodies are decoded and validated in one pass by msgspec
+class RegisterStudentRequest(msgspec.Struct):
+    name: str
+    email: str
+    password: str
+    class_: Optional[str] = msgspec.field(default=None, name='class')
+    college: Optional[str] = None
+
+class RegisterTeacherRequest(msgspec.Struct):
+    name: str
+    email: str
+    password: str
+    institution: Optional[str] = None
+
+class LoginRequest(msgspec.Struct):
+    email: str
+    password: str
+
+class CreateClassRequest(msgspec.Struct):
+    title: str
+    start_time: str
+    end_time: str
+    target_class: Optional[str] = None
+    institution_name: Optional[str] = None
+
+class ChatMessageRequest(msgspec.Struct):
+    roomId: str
+    senderName: str
+    senderRole: str
+    message: str
+    isSystemMessage: bool = False
+
+class BulkChatMessagesRequest(msgspec.Struct):
+    messages: List[ChatMessageRequest]
+
+def decode_request(schema):
+    """Decodes the JSON body into schema; returns None if it is malformed or missing fields."""
+    try:
+        return msgspec.json.decode(request.get_data(cache=False), type=schema)
+    except msgspec.DecodeError:
         return None
 
+# Keyset pagination for list endpoints: ?after=<last id>&limit=<n>
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+def keyset_page(query, id_column):
+    after = request.args.get('after', type=int)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_LIMIT, type=int), 1), MAX_PAGE_LIMIT)
+    if after is not None:
+        query = query.where(id_column > after)
+    rows = [dict(r) for r in db.session.execute(query.order_by(id_column).limit(limit)).mappings()]
+    next_cursor = rows[-1][id_column.key] if len(rows) == limit else None
+    return rows, next_cursor
+
 @app.errorhandler(Exception)
 def handle_exception(e):
-    app.logger.error(f"Unhandled Exception: {str(e)}", exc_info=True)
+    app.logger.error("Unhandled Exception: %s", e, exc_info=True)
     return jsonify({'error': 'Internal server error'}), 500
 
 @app.errorhandler(404)
 def not_found(e):
-    app.logger.warning(f"404 Not Found: {request.path}")
+    app.logger.warning("404 Not Found: %s", request.path)
     return jsonify({'error': 'Not found'}), 404
 
 @app.errorhandler(400)
 def bad_request(e):
-    app.logger.warning(f"400 Bad Request: {request.data}")
+    app.logger.warning("400 Bad Request: %s", request.data)
     return jsonify({'error': 'Bad request'}), 400
 
 # Registration endpoints
 @app.route('/register/student', methods=['POST'])
 def register_student():
     try:
-        data = request.json
-        if not data or not all(k in data for k in ('name', 'email', 'password')):
+        data = decode_request(RegisterStudentRequest)
+        if not data:
             app.logger.warning('Student registration missing fields')
             return jsonify({'error': 'Missing required fields'}), 400
-        if Student.query.filter_by(email=data['email']).first():
-            app.logger.warning(f"Student registration duplicate email: {data['email']}")
+        if Student.query.filter_by(email=data.email).first():
+            app.logger.warning("Student registration duplicate email: %s", data.email)
             return jsonify({'error': 'Email already exists'}), 409
-        hashed_pw = generate_password_hash(data['password'])
-        student = Student(name=data['name'], email=data['email'], class_=data.get('class'), college=data.get('college'), password_hash=hashed_pw)
+        hashed_pw = run_in_hash_pool(hash_password, data.password)
+        student = Student(name=data.name, email=data.email, class_=data.class_, college=data.college, password_hash=hashed_pw)
         db.session.add(student)
         db.session.commit()
-        app.logger.info(f"Student registered: {data['email']}")
+        app.logger.info("Student registered: %s", data.email)
         return jsonify({'message': 'Student registered successfully.'}), 201
     except Exception as e:
-        app.logger.error(f"Student registration error: {str(e)}", exc_info=True)
+        app.logger.error("Student registration error: %s", e, exc_info=True)
         return jsonify({'error': 'Registration failed'}), 500
 
 @app.route('/register/teacher', methods=['POST'])
 def register_teacher():
     try:
-        data = request.json
-        if not data or not all(k in data for k in ('name', 'email', 'password')):
+        data = decode_request(RegisterTeacherRequest)
+        if not data:
             app.logger.warning('Teacher registration missing fields')
             return jsonify({'error': 'Missing required fields'}), 400
-        if Teacher.query.filter_by(email=data['email']).first():
-            app.logger.warning(f"Teacher registration duplicate email: {data['email']}")
+        if Teacher.query.filter_by(email=data.email).first():
+            app.logger.warning("Teacher registration duplicate email: %s", data.email)
             return jsonify({'error': 'Email already exists'}), 409
-        hashed_pw = generate_password_hash(data['password'])
-        teacher = Teacher(name=data['name'], email=data['email'], institution=data.get('institution'), password_hash=hashed_pw)
+        hashed_pw = run_in_hash_pool(hash_password, data.password)
+        teacher = Teacher(name=data.name, email=data.email, institution=data.institution, password_hash=hashed_pw)
         db.session.add(teacher)
         db.session.commit()
-        app.logger.info(f"Teacher registered: {data['email']}")
+        app.logger.info("Teacher registered: %s", data.email)
         return jsonify({'message': 'Teacher registered successfully.'}), 201
     except Exception as e:
-        app.logger.error(f"Teacher registration error: {str(e)}", exc_info=True)
+        app.logger.error("Teacher registration error: %s", e, exc_info=True)
         return jsonify({'error': 'Registration failed'}), 500
 
 # Login endpoints
+# Checked in place of any table with no matching account, so failed lookups cost the same as wrong passwords
+DUMMY_PASSWORD_HASH = hash_password(uuid.uuid4().hex)
+
+@lru_cache(maxsize=8)
+def _legacy_dummy_hash(method):
+    try:
+        return generate_password_hash(uuid.uuid4().hex, method=method)
+    except ValueError:
+        return DUMMY_PASSWORD_HASH
+
+def dummy_password_hash(like_hash=None):
+    """
+    Returns a never-matching hash that costs the same to check as like_hash, so a
+    missing row in one table doesn't stand out next to a legacy werkzeug hash in
+    the other.
+    """
+    if like_hash and not like_hash.startswith('$argon2') and '$' in like_hash:
+        return _legacy_dummy_hash(like_hash.split('$', 1)[0])
+    return DUMMY_PASSWORD_HASH
+
 @app.route('/login', methods=['POST'])
 def login():
     try:
-        data = request.json
-        print('DEBUG login payload:', data)
-        if not data or not all(k in data for k in ('email', 'password')):
+        data = decode_request(LoginRequest)
+        if not data:
             app.logger.warning('Login missing fields')
             return jsonify({'error': 'Missing required fields'}), 400
-        # Try student first
-        user = Student.query.filter_by(email=data['email']).first()
-        role = None
-        if user and check_password_hash(user.password_hash, data['password']):
-            role = 'student'
-        else:
-            # Try teacher
-            user = Teacher.query.filter_by(email=data['email']).first()
-            if user and check_password_hash(user.password_hash, data['password']):
-                role = 'teacher'
-        if role:
-            token = encode_auth_token(user.student_id if role == 'student' else user.teacher_id, role, user.email)
-            print('DEBUG login token:', token)
-            app.logger.info(f"Login success: {data['email']} as {role}")
-            return jsonify({'token': token, 'role': role, 'name': user.name}), 200
-        app.logger.warning(f"Login failed: {data['email']}")
+        # One UNION ALL over both tables and exactly one hash check per table, so
+        # response time doesn't reveal whether (or where) the email exists
+        students = db.session.query(
+            literal('student').label('role'), Student.student_id.label('uid'), Student.name.label('name'),
+            Student.email.label('email'), Student.password_hash.label('password_hash')
+        ).filter(Student.email == data.email)
+        teachers = db.session.query(
+            literal('teacher').label('role'), Teacher.teacher_id.label('uid'), Teacher.name.label('name'),
+            Teacher.email.label('email'), Teacher.password_hash.label('password_hash')
+        ).filter(Teacher.email == data.email)
+        rows = {r.role: r for r in students.union_all(teachers).all()}
+        # Registration only rejects duplicates within a table, so the same email can
+        # be both a student and a teacher; the first row the password matches wins
+        dummy_hash = dummy_password_hash(next((r.password_hash for r in rows.values() if r.password_hash), None))
+        user, new_hash = None, None
+        for role in ('student', 'teacher'):
+            row = rows.get(role)
+            stored_hash = row.password_hash if row and row.password_hash else dummy_hash
+            valid, row_new_hash = run_in_hash_pool(verify_password, stored_hash, data.password)
+            if row and valid and user is None:
+                user, new_hash = row, row_new_hash
+        if user:
+            if new_hash:
+                model = Student if user.role == 'student' else Teacher
+                model.query.filter_by(email=user.email).update({'password_hash': new_hash})
+                db.session.commit()
+            token = encode_auth_token(user.uid, user.role, user.email)
+            app.logger.info("Login success: %s as %s", data.email, user.role)
+            return jsonify({'token': token, 'role': user.role, 'name': user.name}), 200
+        app.logger.warning("Login failed: %s", data.email)
         return jsonify({'error': 'Invalid credentials'}), 401
     except Exception as e:
-        app.logger.error(f"Login error: {str(e)}", exc_info=True)
+        app.logger.error("Login error: %s", e, exc_info=True)
         return jsonify({'error': 'Login failed'}), 500
 
 # Protected route example
@@ -194,92 +433,68 @@ def login():
 def create_class():
     try:
         token = request.headers.get('Authorization')
-        print('DEBUG token:', token)
         if token and token.startswith('Bearer '):
             token = token.split(' ', 1)[1]
         payload = decode_auth_token(token)
-        print('DEBUG payload:', payload)
         if not payload or payload['type'] != 'teacher':
             app.logger.warning('Unauthorized class creation attempt')
             return jsonify({'error': 'Unauthorized'}), 401
-        data = request.json
-        if not data or not all(k in data for k in ('title', 'start_time', 'end_time')):
+        data = decode_request(CreateClassRequest)
+        if not data:
             app.logger.warning('Class creation missing fields')
             return jsonify({'error': 'Missing required fields'}), 400
         # Robust datetime parsing
         try:
-            start_time = parser.isoparse(data['start_time'])
-            end_time = parser.isoparse(data['end_time'])
+            start_time = parser.isoparse(data.start_time)
+            end_time = parser.isoparse(data.end_time)
         except Exception as dt_err:
-            app.logger.error(f"Datetime parse error: {str(dt_err)}")
+            app.logger.error("Datetime parse error: %s", dt_err)
             return jsonify({'error': 'Invalid date format'}), 400
         new_class = Class(
-            title=data['title'],
+            title=data.title,
             teacher_id=payload['sub'],
-            target_class=data.get('target_class'),
-            institution_name=data.get('institution_name'),
+            target_class=data.target_class,
+            institution_name=data.institution_name,
             start_time=start_time,
             end_time=end_time
         )
         db.session.add(new_class)
         db.session.commit()
-        app.logger.info(f"Class created: {data['title']} by teacher {payload['email']}")
+        app.logger.info("Class created: %s by teacher %s", data.title, payload['email'])
         return jsonify({'message': 'Class created', 'room_id': new_class.room_id}), 201
     except Exception as e:
-        app.logger.error(f"Class creation error: {str(e)}", exc_info=True)
+        app.logger.error("Class creation error: %s", e, exc_info=True)
         return jsonify({'error': 'Class creation failed'}), 500
 
 @app.route('/students', methods=['GET'])
 def get_students():
-    students = Student.query.all()
-    return jsonify({'students': [
-        {
-            'student_id': s.student_id,
-            'name': s.name,
-            'email': s.email,
-            'class': s.class_,
-            'college': s.college,
-            'created_at': s.created_at,
-            'password_hash': s.password_hash,           
-        } for s in students
-    ]})
+    rows, next_cursor = keyset_page(select(
+        Student.student_id, Student.name, Student.email, Student.class_.label('class'),
+        Student.college, Student.created_at
+    ), Student.student_id)
+    return orjson_response({'students': rows, 'next_cursor': next_cursor})
 
 @app.route('/teachers', methods=['GET'])
 def get_teachers():
-    teachers = Teacher.query.all()
-    return jsonify({'teachers': [
-        {
-            'teacher_id': t.teacher_id,
-            'name': t.name,
-            'email': t.email,
-            'institution': t.institution,
-            'created_at': t.created_at
-        } for t in teachers
-    ]})
+    rows, next_cursor = keyset_page(select(
+        Teacher.teacher_id, Teacher.name, Teacher.email, Teacher.institution, Teacher.created_at
+    ), Teacher.teacher_id)
+    return orjson_response({'teachers': rows, 'next_cursor': next_cursor})
 
 @app.route('/classes', methods=['GET'])
 def get_classes():
     class_ = request.args.get('class')
     institution = request.args.get('institution')
-    query = Class.query
+    query = select(
+        Class.class_id, Class.title, Class.teacher_id, Class.target_class, Class.institution_name,
+        Class.start_time, Class.end_time, Class.room_id, Class.created_at
+    )
     if class_:
         query = query.filter_by(target_class=class_)
     if institution:
         query = query.filter_by(institution_name=institution)
-    classes = query.all()
-    return jsonify({'classes': [
-        {
-            'class_id': c.class_id,
-            'title': c.title,
-            'teacher_id': c.teacher_id,
-            'target_class': c.target_class,
-            'institution_name': c.institution_name,
-            'start_time': c.start_time,
-            'end_time': c.end_time,
-            'room_id': c.room_id,
-            'created_at': c.created_at
-        } for c in classes
-    ]})
+    rows, next_cursor = keyset_page(query, Class.class_id)
+    return orjson_response({'classes': rows, 'next_cursor': next_cursor})
 
 @app.route('/students/me', methods=['GET'])
 def get_student_me():
@@ -289,7 +504,8 @@ def get_student_me():
     payload = decode_auth_token(token)
     if not payload or payload['type'] != 'student':
         return jsonify({'error': 'Unauthorized'}), 401
-    student = Student.query.filter_by(email=payload['email']).first()
+    # sub carries the student_id, so look the row up by primary key
+    student = db.session.get(Student, int(payload['sub']))
     if not student:
         return jsonify({'error': 'Student not found'}), 404
     return jsonify({
@@ -302,64 +518,133 @@ def get_student_me():
     })
 
 # Chat API Endpoints
+# History cursors carry the stored timestamp as integer microseconds since the
+# epoch, so they compare exactly against the column; message timestamps in
+# responses are rounded to milliseconds and can't be used to resume paging
+CHAT_CURSOR_EPOCH = datetime.datetime(1970, 1, 1)
+
+def chat_cursor(timestamp, message_id):
+    return {'before_ts': (timestamp - CHAT_CURSOR_EPOCH) // datetime.timedelta(microseconds=1), 'before_id': message_id}
+
+def chat_cursor_timestamp(before_ts):
+    """Returns the cursor's timestamp, or None if before_ts is outside the datetime range."""
+    try:
+        return CHAT_CURSOR_EPOCH + datetime.timedelta(microseconds=before_ts)
+    except OverflowError:
+        return None
+
+def chat_page_query(room_id, per_page, before, before_id):
+    """Newest-first page of a room's messages, strictly older than the (before, before_id) cursor."""
+    query = select(ChatMessage).where(ChatMessage.room_id == room_id)
+    if before is not None:
+        query = query.where(or_(
+            ChatMessage.timestamp < before,
+            and_(ChatMessage.timestamp == before, ChatMessage.message_id < before_id)
+        ))
+    return query.order_by(ChatMessage.timestamp.desc(), ChatMessage.message_id.desc()).limit(per_page)
+
+def sqlite_chat_page_response(room_id, per_page, before, before_id):
+    """
+    Encodes each message as JSON inside SQLite, so rows are never hydrated into
+    Python objects. Mirrors ChatMessage.to_dict, including the local-time epoch
+    conversion. Rows come back oldest first from an outer ORDER BY (aggregate
+    order isn't guaranteed before SQLite 3.44), and the cursor is the first row.
+    """
+    page = chat_page_query(room_id, per_page, before, before_id).subquery()
+    raw_ts = type_coerce(page.c.timestamp, String)
+    ts_ms = cast(func.strftime('%s', func.substr(raw_ts, 1, 19), 'utc'), Integer) * 1000 \
+        + cast(func.substr(raw_ts, 21, 3), Integer)
+    message = func.json_object(
+        'id', page.c.message_id, 'roomId', page.c.room_id, 'senderName', page.c.sender_name,
+        'senderRole', page.c.sender_role, 'message', page.c.message_content, 'timestamp', ts_ms,
+        'isSystemMessage', func.json(case((page.c.is_system_message, 'true'), else_='false'))
+    )
+    rows = db.session.execute(
+        select(message.label('message'), raw_ts.label('timestamp'), page.c.message_id)
+        .order_by(page.c.timestamp, page.c.message_id)
+    ).all()
+    next_cursor = None
+    if rows and len(rows) == per_page:
+        next_cursor = chat_cursor(datetime.datetime.fromisoformat(rows[0].timestamp), rows[0].message_id)
+    # Splice the already-encoded messages into the envelope without re-parsing them
+    body = ''.join([
+        '{"success":true,"messages":[', ','.join(r.message for r in rows),
+        '],"next_cursor":', orjson.dumps(next_cursor).decode('utf-8'), '}'
+    ])
+    return Response(body, mimetype='application/json')
+
+# Room stats are polled by every client in a classroom; memoize them briefly and
+# drop the entry whenever the room's messages change
+_stats_cache = TTLCache(maxsize=2048, ttl=3)
+_stats_cache_lock = threading.Lock()
+
+# Upper bound on messages accepted by /chat/messages/bulk
+MAX_CHAT_BULK_SIZE = 500
+
+def invalidate_chat_stats(room_id):
+    with _stats_cache_lock:
+        _stats_cache.pop(room_id, None)
+
 @app.route('/chat/messages/<room_id>', methods=['GET'])
 def get_chat_messages(room_id):
     """Get chat message history for a room"""
     try:
-        # Get pagination parameters
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)  # Default 50 messages per page
+        # Keyset pagination: pass back next_cursor as before_ts/before_id to load older messages
+        # Default 50 messages per page, clamped like keyset_page so a page is never empty or unbounded
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PAGE_LIMIT)
+        before_ts = request.args.get('before_ts', type=int)
+        before_id = request.args.get('before_id', type=int)
         
-        # Query messages for the room, ordered by timestamp (oldest first for history)
-        messages = ChatMessage.query.filter_by(room_id=room_id)\
-                                  .order_by(ChatMessage.timestamp.asc())\
-                                  .paginate(page=page, per_page=per_page, error_out=False)
+        before = None
+        if before_ts is not None and before_id is not None:
+            before = chat_cursor_timestamp(before_ts)
+            if before is None:
+                return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+        if db.engine.dialect.name == 'sqlite':
+            return sqlite_chat_page_response(room_id, per_page, before, before_id)
         
-        # Convert to dict format
-        message_list = [msg.to_dict() for msg in messages.items]
+        # Newest page first, returned oldest first for history
+        messages = db.session.scalars(chat_page_query(room_id, per_page, before, before_id)).all()
+        message_list = [msg.to_dict() for msg in reversed(messages)]
         
-        return jsonify({
+        next_cursor = None
+        if messages and len(messages) == per_page:
+            next_cursor = chat_cursor(messages[-1].timestamp, messages[-1].message_id)
+        
+        return orjson_response({
             'success': True,
             'messages': message_list,
-            'pagination': {
-                'page': messages.page,
-                'pages': messages.pages,
-                'per_page': messages.per_page,
-                'total': messages.total,
-                'has_next': messages.has_next,
-                'has_prev': messages.has_prev
-            }
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
-        app.logger.error(f"Error fetching chat messages: {str(e)}", exc_info=True)
+        app.logger.error("Error fetching chat messages: %s", e, exc_info=True)
         return jsonify({'success': False, 'error': 'Failed to fetch messages'}), 500
 
 @app.route('/chat/messages', methods=['POST'])
 def save_chat_message():
     """Save a new chat message to the database"""
     try:
-        data = request.get_json()
-        
         # Validate required fields
-        required_fields = ['roomId', 'senderName', 'senderRole', 'message']
-        if not data or not all(field in data for field in required_fields):
+        data = decode_request(ChatMessageRequest)
+        if not data:
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
         # Create new chat message
         chat_message = ChatMessage(
-            room_id=data['roomId'],
-            sender_name=data['senderName'],
-            sender_role=data['senderRole'],
-            message_content=data['message'].strip(),
-            is_system_message=data.get('isSystemMessage', False)
+            room_id=data.roomId,
+            sender_name=data.senderName,
+            sender_role=data.senderRole,
+            message_content=data.message.strip(),
+            is_system_message=data.isSystemMessage
         )
         
         # Save to database
         db.session.add(chat_message)
         db.session.commit()
+        invalidate_chat_stats(data.roomId)
         
-        app.logger.info(f"Chat message saved: {data['senderName']} in room {data['roomId']}")
+        app.logger.info("Chat message saved: %s in room %s", data.senderName, data.roomId)
         
         # Return the saved message
         return jsonify({
@@ -369,9 +654,50 @@ def save_chat_message():
         
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error saving chat message: {str(e)}", exc_info=True)
+        app.logger.error("Error saving chat message: %s", e, exc_info=True)
         return jsonify({'success': False, 'error': 'Failed to save message'}), 500
 
+@app.route('/chat/messages/bulk', methods=['POST'])
+def save_chat_messages_bulk():
+    """Save a batch of chat messages in a single INSERT"""
+    try:
+        # Validate the batch and every message in it
+        data = decode_request(BulkChatMessagesRequest)
+        if not data or not data.messages:
+            return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+        if len(data.messages) > MAX_CHAT_BULK_SIZE:
+            return jsonify({'success': False, 'error': f'At most {MAX_CHAT_BULK_SIZE} messages per batch'}), 400
+        
+        rows = [{
+            'room_id': m.roomId,
+            'sender_name': m.senderName,
+            'sender_role': m.senderRole,
+            'message_content': m.message.strip(),
+            'is_system_message': m.isSystemMessage
+        } for m in data.messages]
+        
+        # One executemany round trip; RETURNING hands back the ids in request order
+        result = db.session.execute(
+            insert(ChatMessage).returning(ChatMessage.message_id, sort_by_parameter_order=True),
+            rows
+        )
+        message_ids = result.scalars().all()
+        db.session.commit()
+        for room_id in {row['room_id'] for row in rows}:
+            invalidate_chat_stats(room_id)
+        
+        app.logger.info("Chat messages saved: %s in bulk", len(rows))
+        
+        return jsonify({
+            'success': True,
+            'ids': message_ids
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error("Error saving chat messages: %s", e, exc_info=True)
+        return jsonify({'success': False, 'error': 'Failed to save messages'}), 500
+
 @app.route('/chat/rooms/<room_id>/clear', methods=['DELETE'])
 def clear_chat_history(room_id):
     """Clear all chat messages for a room (admin/teacher only)"""
@@ -380,10 +706,14 @@ def clear_chat_history(room_id):
         # For now, allowing any user to clear (you can add auth later)
         
         # Delete all messages for the room
-        deleted_count = ChatMessage.query.filter_by(room_id=room_id).delete()
+        deleted_count = db.session.execute(
+            delete(ChatMessage).where(ChatMessage.room_id == room_id)
+                               .execution_options(synchronize_session=False)
+        ).rowcount
         db.session.commit()
+        invalidate_chat_stats(room_id)
         
-        app.logger.info(f"Cleared {deleted_count} messages from room {room_id}")
+        app.logger.info("Cleared %s messages from room %s", deleted_count, room_id)
         
         return jsonify({
             'success': True,
@@ -393,36 +723,41 @@ def clear_chat_history(room_id):
         
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error clearing chat history: {str(e)}", exc_info=True)
+        app.logger.error("Error clearing chat history: %s", e, exc_info=True)
         return jsonify({'success': False, 'error': 'Failed to clear chat history'}), 500
 
 @app.route('/chat/rooms/<room_id>/stats', methods=['GET'])
 def get_chat_stats(room_id):
     """Get chat statistics for a room"""
     try:
-        total_messages = ChatMessage.query.filter_by(room_id=room_id).count()
-        
-        # Get unique participants
-        participants = db.session.query(ChatMessage.sender_name, ChatMessage.sender_role)\
-                                .filter_by(room_id=room_id)\
-                                .distinct().all()
-        
-        # Get latest message timestamp
-        latest_message = ChatMessage.query.filter_by(room_id=room_id)\
-                                         .order_by(ChatMessage.timestamp.desc()).first()
-        
-        return jsonify({
-            'success': True,
-            'stats': {
-                'totalMessages': total_messages,
+        with _stats_cache_lock:
+            stats = _stats_cache.get(room_id)
+        if stats is None:
+            # Per-participant counts and latest timestamps in one grouped query
+            participants = db.session.query(
+                ChatMessage.sender_name, ChatMessage.sender_role,
+                func.count(ChatMessage.message_id).label('message_count'),
+                func.max(ChatMessage.timestamp).label('latest')
+            ).filter_by(room_id=room_id)\
+             .group_by(ChatMessage.sender_name, ChatMessage.sender_role).all()
+            
+            latest = max((p.latest for p in participants if p.latest), default=None)
+            stats = {
+                'totalMessages': sum(p.message_count for p in participants),
                 'participantCount': len(participants),
                 'participants': [{'name': p.sender_name, 'role': p.sender_role} for p in participants],
-                'latestMessageTime': int(latest_message.timestamp.timestamp() * 1000) if latest_message else None
+                'latestMessageTime': int(latest.timestamp() * 1000) if latest else None
             }
+            with _stats_cache_lock:
+                _stats_cache[room_id] = stats
+        
+        return orjson_response({
+            'success': True,
+            'stats': stats
         })
         
     except Exception as e:
-        app.logger.error(f"Error getting chat stats: {str(e)}", exc_info=True)
+        app.logger.error("Error getting chat stats: %s", e, exc_info=True)
         return jsonify({'success': False, 'error': 'Failed to get chat stats'}), 500
 
 # PDF upload endpoint
@@ -0,0 +1,10 @@
+# Gunicorn settings for serving the API (run from backend/): gunicorn -c gunicorn.conf.py app:app
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+# gevent workers monkey-patch the stdlib on boot, so DB and network waits
+# overlap across greenlets instead of serializing on the dev server
+worker_class = 'gevent'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
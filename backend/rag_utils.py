@@ -1,9 +1,15 @@
 import os
+import logging
 import pdfplumber
 import uuid
 import hashlib
+import blake3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.embeddings.base import Embeddings
 from langchain.vectorstores import Chroma
 from langchain.llms import OpenAI
 from langchain.chains import RetrievalQA, ConversationalRetrievalChain
@@ -11,6 +17,114 @@ from langchain.chains import RetrievalQA, ConversationalRetrievalChain
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "uploads")
 CHROMA_DIR = os.path.join(os.path.dirname(__file__), "chroma_db")
 
+logger = logging.getLogger(__name__)
+
+# Loading the embedding model and opening Chroma are far more expensive than a
+# query, so both are created once per process and shared.
+_EMBEDDINGS = None
+_VECTORDBS = {}
+_init_lock = threading.Lock()
+
+# Chat clients often resend the same question, so query vectors are memoized
+QUERY_EMBED_CACHE_SIZE = 1024
+
+class _CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an embedding model, caching embed_query results per query string.
+    Vectors are stored as tuples so cached entries can't be mutated by callers.
+    """
+    def __init__(self, base):
+        self._base = base
+        self._embed_query = lru_cache(maxsize=QUERY_EMBED_CACHE_SIZE)(
+            lambda text: tuple(base.embed_query(text))
+        )
+
+    def embed_documents(self, texts):
+        return self._base.embed_documents(texts)
+
+    def embed_query(self, text):
+        return list(self._embed_query(text))
+
+def _get_embeddings():
+    global _EMBEDDINGS
+    if _EMBEDDINGS is None:
+        with _init_lock:
+            if _EMBEDDINGS is None:
+                _EMBEDDINGS = _CachedQueryEmbeddings(HuggingFaceEmbeddings(
+                    model_name="sentence-transformers/all-MiniLM-L6-v2",
+                    encode_kwargs={"batch_size": 64}
+                ))
+    return _EMBEDDINGS
+
+def _get_vectordb(collection_name):
+    vectordb = _VECTORDBS.get(collection_name)
+    if vectordb is None:
+        embeddings = _get_embeddings()
+        with _init_lock:
+            vectordb = _VECTORDBS.get(collection_name)
+            if vectordb is None:
+                vectordb = Chroma(
+                    collection_name,
+                    embedding_function=embeddings,
+                    persist_directory=CHROMA_DIR
+                )
+                _VECTORDBS[collection_name] = vectordb
+    return vectordb
+
+# doc_ids are BLAKE3 content hashes; collections built before that used bare
+# SHA-256 hex digests, which are still recognized so existing chunks aren't re-added
+def _is_sha256_id(chunk_id):
+    return len(chunk_id) == 64 and all(c in "0123456789abcdef" for c in chunk_id)
+
+def _is_doc_id(chunk_id):
+    return chunk_id.startswith("b3:") or _is_sha256_id(chunk_id)
+
+# pdfplumber extraction is pure-Python and CPU-bound, so large PDFs are split
+# into page ranges extracted in parallel processes; small ones stay in-process
+PDF_EXTRACT_MIN_PAGES_PER_WORKER = 8
+
+def _extract_page_range(pdf_path, start, stop):
+    """
+    Returns (page_num, text, error) for pages [start, stop). Opens its own
+    pdfplumber handle since those can't be shared across processes.
+    """
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for idx in range(start, stop):
+            try:
+                pages.append((idx + 1, pdf.pages[idx].extract_text() or "", None))
+            except Exception as page_err:
+                pages.append((idx + 1, None, page_err))
+    return pages
+
+def _extract_pages(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+    workers = min(os.cpu_count() or 1, page_count // PDF_EXTRACT_MIN_PAGES_PER_WORKER)
+    if workers <= 1:
+        return _extract_page_range(pdf_path, 0, page_count)
+    step = -(-page_count // workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_extract_page_range, pdf_path, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        return [page for future in futures for page in future.result()]
+
+# Chunks are embedded and written in batches so memory stays bounded on long PDFs
+PDF_ADD_BATCH_SIZE = 256
+
+def _add_chunks(vectordb, docs):
+    """
+    Embeds docs in one batched call and writes vectors straight to the
+    collection, keyed by doc_id so Chroma's own ids double as the dedup keys.
+    """
+    texts = [d.page_content for d in docs]
+    metadatas = [d.metadata for d in docs]
+    ids = [d.metadata["doc_id"] for d in docs]
+    vectors = _get_embeddings().embed_documents(texts)
+    vectordb._collection.add(ids=ids, documents=texts, embeddings=vectors, metadatas=metadatas)
+
 def process_pdf_and_store(pdf_filename, collection_name="notes"):
     """
     Extracts text from a PDF, chunks it, embeds it, and stores in ChromaDB with metadata.
@@ -22,51 +136,61 @@ def process_pdf_and_store(pdf_filename, collection_name="notes"):
         raise FileNotFoundError(f"{pdf_path} does not exist.")
 
     splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectordb = Chroma(
-        collection_name,
-        embedding_function=embeddings,
-        persist_directory=CHROMA_DIR
-    )
+    vectordb = _get_vectordb(collection_name)
 
-    # Fetch all existing doc_ids once for fast deduplication
+    # Fetch all existing doc_ids once for fast deduplication. Chunk ids are the
+    # doc_id itself, so only the id column is needed; chunks stored before that
+    # (random UUID ids) still have their doc_id read from metadata.
     try:
-        existing = vectordb.get(include=["metadatas"])
-        existing_ids = {m["doc_id"] for m in existing["metadatas"] if m and "doc_id" in m}
+        existing_ids = set(vectordb.get(include=[])["ids"])
+        legacy_ids = [i for i in existing_ids if not _is_doc_id(i)]
+        if legacy_ids:
+            existing_ids.difference_update(legacy_ids)
+            legacy = vectordb.get(ids=legacy_ids, include=["metadatas"])
+            existing_ids.update(m["doc_id"] for m in legacy["metadatas"] if m and "doc_id" in m)
     except Exception:
         existing_ids = set()
+    check_sha256 = any(_is_sha256_id(i) for i in existing_ids)
 
     docs = []
+    added = 0
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, start=1):
-                try:
-                    text = page.extract_text() or ""
-                except Exception as page_err:
-                    print(f"Warning: Could not parse page {page_num} in {pdf_filename}: {page_err}")
+        for page_num, text, page_err in _extract_pages(pdf_path):
+            if page_err is not None:
+                logger.warning("Could not parse page %s in %s: %s", page_num, pdf_filename, page_err)
+                continue
+            if not text.strip():
+                continue
+            page_chunks = splitter.create_documents([text])
+            for chunk_idx, chunk in enumerate(page_chunks):
+                # Use hash of chunk content as doc_id
+                data = chunk.page_content.encode('utf-8')
+                doc_id = "b3:" + blake3.blake3(data).hexdigest()
+                if doc_id in existing_ids:
                     continue
-                if not text.strip():
+                if check_sha256 and hashlib.sha256(data).hexdigest() in existing_ids:
                     continue
-                page_chunks = splitter.create_documents([text])
-                for chunk_idx, chunk in enumerate(page_chunks):
-                    # Use hash of chunk content as doc_id
-                    doc_id = hashlib.sha256(chunk.page_content.encode('utf-8')).hexdigest()
-                    if doc_id in existing_ids:
-                        continue
-                    chunk.metadata = {
-                        "source": pdf_filename,
-                        "page": page_num,
-                        "chunk": chunk_idx,
-                        "doc_id": doc_id
-                    }
-                    docs.append(chunk)
+                chunk.metadata = {
+                    "source": pdf_filename,
+                    "page": page_num,
+                    "chunk": chunk_idx,
+                    "doc_id": doc_id
+                }
+                existing_ids.add(doc_id)
+                docs.append(chunk)
+                if len(docs) >= PDF_ADD_BATCH_SIZE:
+                    _add_chunks(vectordb, docs)
+                    added += len(docs)
+                    docs.clear()
+        if docs:
+            _add_chunks(vectordb, docs)
+            added += len(docs)
     except Exception as e:
         raise RuntimeError(f"Failed to process PDF: {e}")
 
-    if not docs:
+    if not added:
         raise ValueError("No new extractable text found in PDF.")
 
-    vectordb.add_documents(docs)
     vectordb.persist()
     return True
 
@@ -75,12 +199,7 @@ def answer_query(query, chat_history=None, collection_name="notes", top_k=5):
     Answers a question using RAG: retrieves relevant chunks and uses LLM for answer.
     Includes chat history and a system prompt for concise, context-based answers.
     """
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectordb = Chroma(
-        collection_name,
-        embedding_function=embeddings,
-        persist_directory=CHROMA_DIR
-    )
+    vectordb = _get_vectordb(collection_name)
     retriever = vectordb.as_retriever(
         search_type="similarity",  # or "mmr" for diversity
         search_kwargs={"k": top_k}
@@ -30,13 +30,20 @@ const StudentDashboard = () => {
         setStudentInstitution(infoData.college);
         setStudentName(infoData.name);
         // Fetch classes filtered by class and institution
-        const res = await fetch(`${API_URL}/classes?class=${encodeURIComponent(infoData.class)}&institution=${encodeURIComponent(infoData.college)}`, {
-          method: 'GET',
-          headers: { 'Authorization': `Bearer ${token}` }
-        });
-        const data = await res.json();
-        if (!res.ok) throw new Error(data.error || 'Failed to fetch classes');
-        setUpcomingClasses(data.classes || []);
+        // /classes is paginated; follow next_cursor until every page is loaded
+        const classes = [];
+        let after = null;
+        do {
+          const res = await fetch(`${API_URL}/classes?class=${encodeURIComponent(infoData.class)}&institution=${encodeURIComponent(infoData.college)}${after != null ? `&after=${after}` : ''}`, {
+            method: 'GET',
+            headers: { 'Authorization': `Bearer ${token}` }
+          });
+          const data = await res.json();
+          if (!res.ok) throw new Error(data.error || 'Failed to fetch classes');
+          classes.push(...(data.classes || []));
+          after = data.next_cursor;
+        } while (after != null);
+        setUpcomingClasses(classes);
       } catch (err) {
         setError(err.message);
       } finally {
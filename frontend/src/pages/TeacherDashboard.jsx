@@ -22,13 +22,20 @@ const TeacherDashboard = () => {
       try {
         const token = localStorage.getItem('token');
         // Example: fetch classes for teacher (endpoint to be implemented in backend)
-        const res = await fetch(`${API_URL}/classes`, {
-          method: 'GET',
-          headers: { 'Authorization': `Bearer ${token}` }
-        });
-        if (!res.ok) throw new Error('Failed to fetch classes');
-        const data = await res.json();
-        setScheduledClasses(data.classes || []);
+        // /classes is paginated; follow next_cursor until every page is loaded
+        const classes = [];
+        let after = null;
+        do {
+          const res = await fetch(`${API_URL}/classes${after != null ? `?after=${after}` : ''}`, {
+            method: 'GET',
+            headers: { 'Authorization': `Bearer ${token}` }
+          });
+          if (!res.ok) throw new Error('Failed to fetch classes');
+          const data = await res.json();
+          classes.push(...(data.classes || []));
+          after = data.next_cursor;
+        } while (after != null);
+        setScheduledClasses(classes);
       } catch (err) {
         setError(err.message);
       } finally {